@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, Dict, Any, List
 
 class QueryRequest(BaseModel):
@@ -7,6 +7,7 @@ class QueryRequest(BaseModel):
     db_name: str = "default"  # Database name to use
     cache_ttl: Optional[int] = None  # Custom TTL in seconds
     force_refresh: bool = False  # Ignore cache
+    wait_for_extensions: bool = False  # Wait for the database's extensions to finish loading
 
 class ConvertedQueryRequest(BaseModel):
     origin_dialect: str
@@ -18,20 +19,28 @@ class OptimizedQueryRequest(BaseModel):
 
 # Response models
 class ConvertedQueryResponse(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='forbid')
+
     converted_query: str
 
 class OptimizedQueryResponse(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='forbid')
+
     optimized_query: str
 
 class QueryResponse(BaseModel):
-    id: str
+    model_config = ConfigDict(frozen=True, extra='forbid')
+
+    id: Optional[str] = None  # Only set for tracked queries
     status: str
-    result: Optional[List[Dict[str, Any]]] = None
+    result: Optional[Dict[str, Any]] = None  # {"columns": [...], "rows": [[...], ...]}
     error: Optional[str] = None
     cached: bool = False
     execution_time: Optional[float] = None
 
 class ExtensionInfo(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='forbid')
+
     name: str
     path: str
     loaded_in_dbs: List[str]
@@ -17,7 +17,10 @@ class Settings(BaseSettings):
     EXTENSIONS_DIR: str = os.getenv("EXTENSIONS_DIR", "extensions")
     
     # Performance settings
-    MAX_WORKERS: int = int(os.getenv("MAX_WORKERS", "30"))
+    MAX_WORKERS: int = int(os.getenv("MAX_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+    MAX_PENDING_QUERIES: int = int(os.getenv("MAX_PENDING_QUERIES", str(MAX_WORKERS * 4)))
+    QUEUE_TIMEOUT: float = float(os.getenv("QUEUE_TIMEOUT", "5"))  # seconds
+    MAX_STREAMS: int = int(os.getenv("MAX_STREAMS", str(MAX_WORKERS)))
     
     # Cache settings
     CACHE_EXPIRY: int = int(os.getenv("CACHE_EXPIRY", "300"))  # seconds
@@ -30,6 +33,7 @@ class Settings(BaseSettings):
 
     APP_HOST: str = os.getenv("APP_HOST", "0.0.0.0")
     APP_PORT: int = int(os.getenv("APP_PORT", "8000"))
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "info")
     
     class Config:
         env_file = ".env"
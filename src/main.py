@@ -2,353 +2,588 @@ import sqlean
 import os
 import asyncio
 import time
-import hashlib
-import json
 import uuid
-import glob
 import platform
-from concurrent.futures import ThreadPoolExecutor
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Header, Request
+import functools
+import hmac
+import logging
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from concurrent.futures import Future, ThreadPoolExecutor
+from fastapi import FastAPI, HTTPException, Query, Request, Response, Security
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import APIKeyHeader
+from starlette.concurrency import iterate_in_threadpool
+import orjson
 import uvicorn
 import sqlglot
 from sqlglot.optimizer import optimize
 from config import settings
 from api.types import QueryRequest, QueryResponse, ConvertedQueryRequest, ConvertedQueryResponse, OptimizedQueryRequest, OptimizedQueryResponse, LoadExtensionRequest
-from services.cache_service import QueryCache
+from services.cache_service import ShardedQueryCache, generate_cache_key
+from services.results_service import QueryResultsStore
+from services.pool_service import ConnectionPool, PoolTimeout
+logger = logging.getLogger(__name__)
+
 # Create directories if they don't exist
 os.makedirs(settings.DB_DIR, exist_ok=True)
 os.makedirs(settings.EXTENSIONS_DIR, exist_ok=True)
 
+# SQLite BLOB columns come back as bytes, which orjson cannot encode on its own
+def _json_default(value):
+    """Encodes values orjson does not support natively, decoding bytes as UTF-8 text"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).decode("utf-8", errors="replace")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+class ResultJSONResponse(ORJSONResponse):
+    """ORJSONResponse that can also render query results containing BLOBs"""
+    def render(self, content) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_json_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+
+# Authentication system; the header scheme only documents the key in OpenAPI,
+# APIKeyMiddleware below does the actual check
+api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
+
 app = FastAPI(
     title=settings.APP_NAME,
     description=settings.APP_DESCRIPTION,
-    version=settings.APP_VERSION
+    version=settings.APP_VERSION,
+    default_response_class=ResultJSONResponse,
+    dependencies=[Security(api_key_header, use_cache=True)]
 )
 
-# Authentication system
-api_key_header = APIKeyHeader(name="X-API-Key")
+class APIKeyMiddleware:
+    """ASGI middleware rejecting requests without a valid X-API-Key header"""
+    def __init__(self, app, api_key, public_paths):
+        self.app = app
+        self.api_key = api_key.encode()
+        self.public_paths = public_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] not in self.public_paths:
+            api_key = b""
+            for name, value in scope["headers"]:
+                if name == b"x-api-key":
+                    api_key = value
+                    break
+            # Constant-time comparison so the key can't be guessed by timing
+            if not hmac.compare_digest(api_key, self.api_key):
+                response = ORJSONResponse({"detail": "Invalid API Key"}, status_code=401)
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
 
-def verify_api_key(api_key: str = Depends(api_key_header)):
-    if api_key != settings.API_KEY:
-        raise HTTPException(
-            status_code=401,
-            detail="Invalid API Key"
-        )
-    return api_key
+# The interactive docs stay reachable without a key
+app.add_middleware(
+    APIKeyMiddleware,
+    api_key=settings.API_KEY,
+    public_paths={app.docs_url, app.redoc_url, app.openapi_url, app.swagger_ui_oauth2_redirect_url}
+)
 
 # Connections and management structures
-db_connections = {}  # Stores connections for each database
-db_extensions = {}   # Stores loaded extensions for each DB: {db_name: [extension_names]}
-query_results = {}   # Stores results for ongoing queries
+db_pools = {}  # Stores a connection pool for each database
+db_pools_lock = threading.Lock()
+db_extensions = {}   # Stores loaded extensions for each DB: {db_name: {extension_name: entry_point}}
+ext_to_dbs = {}  # Reverse index of db_extensions: {extension_name: {db_names}}
+db_extension_futures = {}  # Background loading of the available extensions for each DB
+query_results = QueryResultsStore()  # Stores results of tracked queries
 executor = ThreadPoolExecutor(max_workers=settings.MAX_WORKERS)
+executor_slots = None  # Semaphore bounding queued executor work, created on startup
+stream_slots = None  # Semaphore bounding open /query/stream responses, created on startup
+STREAM_BATCH_SIZE = 1000  # Rows fetched per batch by /query/stream
 
 # Cache instance
-query_cache = QueryCache()
-
-# Determines file extension for shared libraries based on operating system
-def get_extension_file_pattern():
-    system = platform.system().lower()
-    if system == 'linux':
-        return '*.so'
-    elif system == 'darwin':
-        return '*.dylib'
-    elif system == 'windows':
-        return '*.dll'
-    else:
-        return '*'  # Try any file on unknown systems
-    
+query_cache = ShardedQueryCache()
+
+# File extensions for shared libraries on this operating system
+_EXT_SUFFIXES = {
+    "linux": (".so",),
+    "darwin": (".dylib",),
+    "windows": (".dll",),
+}.get(platform.system().lower(), ("",))  # Try any file on unknown systems
+
+# Snapshot of the extensions directory, rebuilt only when its mtime changes
+_ext_cache = {"mtime": None, "entries": []}
+
 def load_all_extensions(db_name):
     """Load all available extensions for a database"""
     extensions = discover_extensions()
     for ext in extensions:
         try:
-            load_extension(db_name, os.path.splitext(ext['name'])[0])
+            load_extension(db_name, ext['name'])
         except Exception as e:
-            print(f"Could not load extension {ext['name']}: {str(e)}")
-
-# Function to get or create a database connection
-def get_db_connection(db_name, load_extensions=True):
-    """Gets or creates a connection to the specified database"""
-    if db_name not in db_connections:
-        db_path = os.path.join(settings.DB_DIR, f"{db_name}.db")
-        # Enable extension loading
-        sqlean.extensions.enable_all()
-        conn = sqlean.connect(db_path)
-        conn.enable_load_extension(True)
-
-        # Load extensions from shared libraries
-        if load_extensions:
-            load_all_extensions(db_name=db_name)
-
-        # WAL mode
-        conn.execute("PRAGMA journal_mode=WAL")
-
-        conn.row_factory = sqlean.Row
-        db_connections[db_name] = conn
-        db_extensions[db_name] = [
-            ext for ext in os.listdir(settings.EXTENSIONS_DIR)
-            if ext.endswith(get_extension_file_pattern())
-        ]
-    return db_connections[db_name]
+            logger.warning("Could not load extension %s: %s", ext['name'], e)
+
+class PooledConnection(sqlean.Connection):
+    """Connection that remembers which extensions have been loaded into it"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loaded_extensions = set()
+
+def _open_connection(db_name):
+    """Opens a new pooled connection to the specified database"""
+    db_path = os.path.join(settings.DB_DIR, f"{db_name}.db")
+    # Enable extension loading
+    sqlean.extensions.enable_all()
+    conn = sqlean.connect(db_path, check_same_thread=False, factory=PooledConnection)
+    conn.enable_load_extension(True)
+
+    # WAL mode allows concurrent readers across the pooled connections
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")
+
+    return conn
+
+def _open_db(db_name):
+    """Creates the connection pool for a database and prepares it once"""
+    with db_pools_lock:
+        pool = db_pools.get(db_name)
+        if pool is not None:
+            return pool
+        pool = ConnectionPool(lambda: _open_connection(db_name), settings.MAX_WORKERS, settings.QUEUE_TIMEOUT)
+        db_pools[db_name] = pool
+        db_extensions.setdefault(db_name, {})
+        # Registered together with the pool, so await_extensions never sees
+        # the pool without something to wait on
+        extensions_ready = Future()
+        db_extension_futures[db_name] = extensions_ready
+
+    try:
+        # Open the first connection now so its pragmas don't land on a request
+        with pool.connection():
+            pass
+
+        # Load extensions from shared libraries in the background
+        executor.submit(_load_extensions_in_background, db_name, extensions_ready)
+    except BaseException:
+        # Nothing will load the extensions, don't leave waiters hanging
+        extensions_ready.set_result(None)
+        raise
+    return pool
+
+def _load_extensions_in_background(db_name, extensions_ready):
+    """Loads the available extensions into a database, then resolves its future"""
+    try:
+        load_all_extensions(db_name)
+    finally:
+        extensions_ready.set_result(None)
+
+async def await_extensions(db_name):
+    """Waits until the available extensions have been loaded into a database"""
+    if db_name not in db_pools:
+        await run_in_executor(_get_pool, db_name)
+    future = db_extension_futures.get(db_name)
+    if future is not None and not future.done():
+        await asyncio.wrap_future(future)
+
+def _get_pool(db_name):
+    """Gets or creates the connection pool for the specified database"""
+    pool = db_pools.get(db_name)
+    if pool is None:
+        pool = _open_db(db_name)
+    return pool
+
+def _load_into_connection(conn, extension_name, entry_point=None):
+    """Loads an extension into a single connection"""
+    extension_path = os.path.join(settings.EXTENSIONS_DIR, extension_name)
+    if entry_point:
+        conn.load_extension(extension_path, entry_point)
+    else:
+        conn.load_extension(extension_path)
+    conn.loaded_extensions.add(extension_name)
+
+# Function to borrow a database connection
+@contextmanager
+def get_db_connection(db_name):
+    """Borrows a pooled connection to the specified database"""
+    with _get_pool(db_name).connection() as conn:
+        # Catch up on extensions loaded since this connection was opened
+        registered = db_extensions.get(db_name)
+        if registered and len(conn.loaded_extensions) < len(registered):
+            for extension_name, entry_point in list(registered.items()):
+                if extension_name not in conn.loaded_extensions:
+                    _load_into_connection(conn, extension_name, entry_point)
+        yield conn
 
 # Loads a specific extension in a database
 def load_extension(db_name, extension_name, entry_point=None):
     """Loads a specified extension into a database"""
-    conn = get_db_connection(db_name, load_extensions=False)
-    extension_path = os.path.join(settings.EXTENSIONS_DIR, extension_name)
-    
     try:
-        if entry_point:
-            conn.load_extension(extension_path, entry_point)
-        else:
-            conn.load_extension(extension_path)
+        with get_db_connection(db_name) as conn:
+            _load_into_connection(conn, extension_name, entry_point)
         
-        # Add to the list of loaded extensions for this database
-        if extension_name not in db_extensions.get(db_name, []):
-            if db_name not in db_extensions:
-                db_extensions[db_name] = []
-            db_extensions[db_name].append(extension_name)
+        # Register it so the other pooled connections load it on their next use
+        db_extensions.setdefault(db_name, {})[extension_name] = entry_point
+        ext_to_dbs.setdefault(extension_name, set()).add(db_name)
         
         return True
     except sqlean.Error as e:
         raise Exception(f"Error loading extension '{extension_name}': {str(e)}")
 
+# Metadata queries (e.g. SELECT sqlite_version()) are never cached
+_METADATA_QUERY_RE = re.compile(r"\s*select\s+sqlite_", re.IGNORECASE)
+
+def _is_select(query):
+    """Checks if a query is a SELECT without copying or uppercasing all of it"""
+    i = 0
+    length = len(query)
+    while i < length and query[i] in " \t\r\n":
+        i += 1
+    return query[i:i + 6].lower() == "select"
+
+def _is_cacheable(query):
+    """Checks if the results of a query are stored in the query cache"""
+    return _is_select(query) and not _METADATA_QUERY_RE.match(query)
+
 # Function to execute queries in a separate thread
-def execute_query(query_id, query, params, db_name, cache_ttl=None, force_refresh=False):
-    """Executes a query in a separate thread with caching support"""
+def execute_sql_sync(query, params, db_name, cache_key, cache_ttl=None):
+    """Executes a query against the database, caching SELECT results"""
     start_time = time.time()
     try:
-        # Check cache first, unless force_refresh is True
-        cache_key = generate_cache_key(query, params, db_name)
-        if not force_refresh:
-            cached_result, hit = query_cache.get(cache_key)
-            if hit:
-                query_results[query_id] = {
-                    "status": "completed",
-                    "result": cached_result,
-                    "cached": True,
-                    "execution_time": 0.0
-                }
-                return
-        
-        # If not in cache or force_refresh is True, execute the query
-        conn = get_db_connection(db_name)
-        cursor = conn.cursor()
-        
-        if params:
-            cursor.execute(query, params)
-        else:
-            cursor.execute(query)
-        
-        # Check if it's a SELECT query or a modification operation
-        if query.strip().upper().startswith("SELECT"):
-            results = [dict(row) for row in cursor.fetchall()]
+        with get_db_connection(db_name) as conn:
+            cursor = conn.cursor()
             
-            # Store in cache if it's a SELECT query
-            if not query.strip().upper().startswith("SELECT SQLITE_"):  # Don't cache metadata queries
-                query_cache.set(cache_key, results, cache_ttl)
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
             
-            query_results[query_id] = {
-                "status": "completed",
-                "result": results,
-                "cached": False,
-                "execution_time": time.time() - start_time
-            }
-        else:
-            # For modification operations, don't use cache
-            conn.commit()
-            query_results[query_id] = {
-                "status": "completed",
-                "result": [{"rows_affected": cursor.rowcount}],
-                "cached": False,
-                "execution_time": time.time() - start_time
-            }
+            # Check if it's a SELECT query or a modification operation
+            if _is_select(query):
+                # Columnar shape: column names once, rows as plain tuples
+                results = {
+                    "columns": [column[0] for column in cursor.description],
+                    "rows": cursor.fetchall()
+                }
+                
+                result_data = {
+                    "status": "completed",
+                    "result": results,
+                    "cached": False,
+                    "execution_time": time.time() - start_time
+                }
+                
+                # Store in cache if it's a SELECT query
+                if not _METADATA_QUERY_RE.match(query):  # Don't cache metadata queries
+                    # The digest identifies this version of the result, for the ETag
+                    result_data["digest"] = query_cache.set(cache_key, results, cache_ttl)
+                
+                return result_data
+            else:
+                # For modification operations, don't use cache
+                conn.commit()
+                return {
+                    "status": "completed",
+                    "result": {"columns": ["rows_affected"], "rows": [[cursor.rowcount]]},
+                    "cached": False,
+                    "execution_time": time.time() - start_time
+                }
+    except PoolTimeout:
+        # Not a query error, the server is busy; run_in_executor answers 503
+        raise
     except Exception as e:
-        query_results[query_id] = {
+        logger.info("Error executing query: %s", e)
+        return {
             "status": "error",
             "error": str(e),
             "execution_time": time.time() - start_time
         }
-        print(f"Error executing query: {str(e)}")
 
-# Function to generate a cache key based on query and parameters
-def generate_cache_key(query, params, db_name):
-    """Generates a unique cache key for a query"""
-    query_normalized = " ".join(query.split()).lower()
-    params_str = json.dumps(params, sort_keys=True) if params else ""
-    key_data = f"{db_name}:{query_normalized}:{params_str}"
-    return hashlib.md5(key_data.encode()).hexdigest()
+# Streams the result of a SELECT as NDJSON in fixed-size batches
+def stream_query_rows(query, params, db_name):
+    """Yields a header line with the columns, then one JSON array per row"""
+    # The connection stays open for as long as the client takes to read, so it
+    # is opened outside the pool rather than holding up pooled queries meanwhile
+    conn = _open_connection(db_name)
+    try:
+        for extension_name, entry_point in list(db_extensions.get(db_name, {}).items()):
+            _load_into_connection(conn, extension_name, entry_point)
+
+        cursor = conn.cursor()
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        yield orjson.dumps({"columns": [column[0] for column in cursor.description]}) + b"\n"
+
+        while True:
+            rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+            if not rows:
+                break
+            yield b"".join(orjson.dumps(row, default=_json_default) + b"\n" for row in rows)
+    finally:
+        conn.close()
+
+def _server_busy():
+    """Builds the 503 returned when the server has no capacity left for a request"""
+    return HTTPException(
+        status_code=503,
+        detail="Server is busy, try again later",
+        headers={"Retry-After": "1"}
+    )
+
+# Runs blocking work in the thread pool with backpressure
+async def run_in_executor(func, *args):
+    """Runs a function in the executor, answering 503 when too much work is queued"""
+    try:
+        await asyncio.wait_for(executor_slots.acquire(), settings.QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise _server_busy()
+
+    loop = asyncio.get_running_loop()
+    try:
+        future = executor.submit(func, *args)
+    except Exception:
+        executor_slots.release()
+        raise
+    # Free the slot only once the worker thread is done with it: a cancelled
+    # request stops waiting, but the thread keeps running its query. The
+    # callback runs on the worker thread, the semaphore belongs to the loop
+    future.add_done_callback(lambda _: loop.call_soon_threadsafe(executor_slots.release))
+    try:
+        return await asyncio.wrap_future(future)
+    except PoolTimeout:
+        raise _server_busy()
 
 # Periodic task to clean up expired cache
 async def periodic_cache_cleanup():
-    """Periodically cleans up expired cache entries"""
+    """Periodically cleans up expired tracked results"""
+    # The query cache expires its items on access and during inserts, so it is not swept here
     while True:
         await asyncio.sleep(60)  # Every minute
-        query_cache.cleanup_expired()
+        query_results.cleanup_expired()
 
 # Initialize a database with example table
 def init_db(db_name):
     """Initializes a database with an example table"""
-    print(f"Initializing database '{db_name}'")
+    logger.info("Initializing database '%s'", db_name)
     db_path = os.path.join(settings.DB_DIR, f"{db_name}.db")
-    sqlean.extensions.enable_all()
-    conn = sqlean.connect(db_path)
-    # Enable extension loading
-    conn.enable_load_extension(True)
-    cursor = conn.cursor()
+    # Autocommit mode: the script runs without an implicit BEGIN/COMMIT around it
+    conn = sqlean.connect(db_path, isolation_level=None)
     
-    # Example table
-    cursor.execute('''
+    # WAL is switched on here so the file is ready before the first write;
+    # the journal mode is persistent, the other pragmas are set per pooled connection
+    conn.executescript('''
+    PRAGMA journal_mode=WAL;
+
+    -- Example table
     CREATE TABLE IF NOT EXISTS example (
         id INTEGER PRIMARY KEY,
         name TEXT,
         value REAL,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
+    );
     ''')
 
-    conn.commit()
     conn.close()
 
+# Parsing dominates the tools endpoints, so repeated queries are memoized
+@functools.lru_cache(maxsize=settings.MAX_CACHE_SIZE)
+def _optimize_cached(query):
+    return optimize(sqlglot.parse_one(query)).sql(pretty=True)
+
+@functools.lru_cache(maxsize=settings.MAX_CACHE_SIZE)
+def _transpile_cached(origin_dialect, target_dialect, query):
+    result = sqlglot.transpile(query, read=origin_dialect, write=target_dialect)
+    return result[0] if result else ""
+
 def optimize_query(query):
     """Optimizes an SQL query using sqlglot"""
     try:
-        return optimize(sqlglot.parse_one(query)).sql(pretty=True)
+        return _optimize_cached(query)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error optimizing query: {str(e)}")
 
 def convert_query(origin_dialect, target_dialect, query):
     """Converts a query from one SQL dialect to another"""
     try:
-        result = sqlglot.transpile(query, read=origin_dialect, write=target_dialect)
-        return result[0] if result else ""
+        return _transpile_cached(origin_dialect, target_dialect, query)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error converting query: {str(e)}")
 
 # Detects and lists available extensions
 def discover_extensions():
     """Discovers available SQLite extensions in the extensions directory"""
-    extensions = []
-    pattern = get_extension_file_pattern()
-    extension_files = glob.glob(os.path.join(settings.EXTENSIONS_DIR, pattern))
+    mtime = os.stat(settings.EXTENSIONS_DIR).st_mtime_ns
+    if _ext_cache["mtime"] != mtime:
+        with os.scandir(settings.EXTENSIONS_DIR) as entries:
+            _ext_cache["entries"] = [
+                {"name": entry.name, "path": entry.path}
+                for entry in entries
+                if entry.name.endswith(_EXT_SUFFIXES) and entry.is_file()
+            ]
+        _ext_cache["mtime"] = mtime
     
-    for file_path in extension_files:
-        extension_name = os.path.basename(file_path)
-        extensions.append({
-            "name": extension_name,
-            "path": file_path
-        })
-    
-    return extensions
+    return _ext_cache["entries"]
 
 # API Endpoints
 
 @app.post("/tools/optimize", response_model=OptimizedQueryResponse, tags=["Tools"])
-async def optimize_query_endpoint(
-    query_req: OptimizedQueryRequest,
-    api_key: str = Depends(verify_api_key)
-):
+async def optimize_query_endpoint(query_req: OptimizedQueryRequest):
     """Optimizes an SQL query for better performance"""
     return OptimizedQueryResponse(
         optimized_query=optimize_query(query_req.query)
     )
 
 @app.post("/tools/convert", response_model=ConvertedQueryResponse, tags=["Tools"])
-async def convert_query_endpoint(
-    query_req: ConvertedQueryRequest,
-    api_key: str = Depends(verify_api_key)
-):
+async def convert_query_endpoint(query_req: ConvertedQueryRequest):
     """Converts an SQL query from one dialect to another"""
     return ConvertedQueryResponse(
         converted_query=convert_query(query_req.origin_dialect, query_req.target_dialect, query_req.query)
     )
 
+@app.post("/tools/cache/clear", tags=["Tools"])
+async def clear_tools_cache():
+    """Clears the memoized optimize and convert results"""
+    _optimize_cached.cache_clear()
+    _transpile_cached.cache_clear()
+    return {"message": "Tools cache cleared"}
 
-@app.post("/query", response_model=QueryResponse, tags=["Queries"])
-async def run_query(
-    query_req: QueryRequest, 
-    background_tasks: BackgroundTasks,
-    api_key: str = Depends(verify_api_key)
-):
-    """Executes an SQL query against a specified database"""
-    # Generate a unique ID for the query
-    query_id = str(uuid.uuid4())
-    
-    # Initialize query status
-    query_results[query_id] = {"status": "pending"}
-    
-    # Execute the query in a separate thread
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(
-        executor, 
-        execute_query, 
-        query_id, 
-        query_req.query, 
-        query_req.params,
-        query_req.db_name,
-        query_req.cache_ttl,
-        query_req.force_refresh
-    )
-    
-    # Return the result or error
-    result_data = query_results[query_id]
-    
-    # Clean up the result from memory after a while
-    async def cleanup():
-        await asyncio.sleep(300)  # Clean up after 5 minutes
-        if query_id in query_results:
-            del query_results[query_id]
-            
-    background_tasks.add_task(cleanup)
-    
-    # Prepare the response
-    response = {
+def build_query_response(query_id, result_data):
+    """Builds the QueryResponse-shaped body for a query result"""
+    return {
         "id": query_id,
         "status": result_data["status"],
+        "result": result_data.get("result"),
+        "error": result_data.get("error"),
         "cached": result_data.get("cached", False),
         "execution_time": result_data.get("execution_time")
     }
+
+def _result_etag(cache_key, digest):
+    """Builds the ETag of a cached result from its cache key and content digest"""
+    return f'"{cache_key}.{digest}"'
+
+# The query endpoints return ResultJSONResponse directly so the (possibly large)
+# result skips response-model validation; QueryResponse only documents the shape
+@app.post("/query", responses={200: {"model": QueryResponse}}, tags=["Queries"])
+async def run_query(
+    query_req: QueryRequest, 
+    request: Request,
+    track: bool = Query(False, description="Keep the result so it can be fetched again from GET /query/{query_id}")
+):
+    """Executes an SQL query against a specified database"""
+    # Check cache first, unless force_refresh is True; hits never leave the event loop.
+    # Writes are never cached, so they get no key at all
+    cacheable = _is_cacheable(query_req.query)
+    cache_key = None
+    cached = None
+    if cacheable:
+        cache_key = generate_cache_key(query_req.query, query_req.params, query_req.db_name)
+        if not query_req.force_refresh:
+            cached = query_cache.lookup(cache_key)
+    hit = cached is not None
+
+    if hit:
+        cached_result, digest, expiry = cached
+
+        # The ETag names both the query and this version of its cached result
+        etag = _result_etag(cache_key, digest)
+        # Clients may keep the result for as long as it has left in the cache
+        max_age = max(0, int(expiry - time.time()))
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={
+                "ETag": etag,
+                "X-Cache": "HIT",
+                "Cache-Control": f"private, max-age={max_age}"
+            })
+
+        result_data = {
+            "status": "completed",
+            "result": cached_result,
+            "cached": True,
+            "execution_time": 0.0,
+            "digest": digest
+        }
+    else:
+        # Same TTL rule as QueryCache.set; zero or negative means not cached at all
+        ttl = query_req.cache_ttl if query_req.cache_ttl is not None else settings.CACHE_EXPIRY
+        max_age = max(0, int(ttl))
+
+        if query_req.wait_for_extensions:
+            await await_extensions(query_req.db_name)
+
+        # Execute the query in a separate thread and wait for its result
+        result_data = await run_in_executor(
+            execute_sql_sync, 
+            query_req.query, 
+            query_req.params,
+            query_req.db_name,
+            cache_key,
+            query_req.cache_ttl
+        )
     
-    if "result" in result_data:
-        response["result"] = result_data["result"]
-    if "error" in result_data:
-        response["error"] = result_data["error"]
+    # Only keep the result around when the client asked to poll it later
+    query_id = None
+    if track:
+        query_id = str(uuid.uuid4())
+        query_results.set(query_id, result_data)
 
-    print(response)
+    logger.debug("query on '%s' status=%s", query_req.db_name, result_data["status"])
         
+    response = ResultJSONResponse(build_query_response(query_id, result_data))
+    if result_data["status"] == "completed" and cacheable:
+        response.headers["ETag"] = _result_etag(cache_key, result_data["digest"])
+        response.headers["X-Cache"] = "HIT" if hit else "MISS"
+        response.headers["Cache-Control"] = f"private, max-age={max_age}"
     return response
 
-@app.get("/query/{query_id}", response_model=QueryResponse, tags=["Queries"])
-async def get_query_status(
-    query_id: str,
-    api_key: str = Depends(verify_api_key)
-):
+@app.post("/query/stream", tags=["Queries"])
+async def stream_query(query_req: QueryRequest):
+    """Streams the rows of a SELECT query as NDJSON without caching them"""
+    if not _is_select(query_req.query):
+        raise HTTPException(status_code=400, detail="Only SELECT queries can be streamed")
+
+    # Each stream keeps a connection and a thread busy until the client has read it all
+    try:
+        await asyncio.wait_for(stream_slots.acquire(), settings.QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise _server_busy()
+
+    rows = stream_query_rows(query_req.query, query_req.params, query_req.db_name)
+
+    # Run the query before answering so SQL errors still map to a 400
+    try:
+        header = await run_in_executor(next, rows)
+    except HTTPException:
+        stream_slots.release()
+        raise
+    except Exception as e:
+        stream_slots.release()
+        raise HTTPException(status_code=400, detail=f"Error executing query: {str(e)}")
+
+    async def body():
+        try:
+            yield header
+            async for chunk in iterate_in_threadpool(rows):
+                yield chunk
+        finally:
+            # Closes the connection if the client went away
+            rows.close()
+            stream_slots.release()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+@app.get("/query/{query_id}", responses={200: {"model": QueryResponse}}, tags=["Queries"])
+async def get_query_status(query_id: str):
     """Retrieves the status and results of a previously executed query"""
-    if query_id not in query_results:
+    result_data = query_results.get(query_id)
+    if result_data is None:
         raise HTTPException(status_code=404, detail="Query not found")
     
-    result_data = query_results[query_id]
-    
-    response = {
-        "id": query_id,
-        "status": result_data["status"],
-        "cached": result_data.get("cached", False),
-        "execution_time": result_data.get("execution_time")
-    }
-    
-    if "result" in result_data:
-        response["result"] = result_data["result"]
-    if "error" in result_data:
-        response["error"] = result_data["error"]
-        
-    return response
+    return ResultJSONResponse(build_query_response(query_id, result_data))
 
 @app.post("/db/{db_name}", status_code=201, tags=["Databases"])
-async def create_database(
-    db_name: str,
-    api_key: str = Depends(verify_api_key)
-):
+async def create_database(db_name: str):
     """Creates a new SQLite database"""
     if not db_name.isalnum():
         raise HTTPException(status_code=400, detail="Database name must contain only letters and numbers")
@@ -361,26 +596,18 @@ async def create_database(
 
 # Extension management endpoints
 @app.get("/extensions", tags=["Extensions"])
-async def list_extensions(
-    api_key: str = Depends(verify_api_key)
-):
+async def list_extensions():
     """Lists all available SQLite extensions"""
-    extensions = discover_extensions()
-    
     # Add information about which databases have each extension loaded
-    for ext in extensions:
-        ext["loaded_in_dbs"] = []
-        for db_name, loaded_exts in db_extensions.items():
-            if os.path.basename(ext["path"]) in loaded_exts:
-                ext["loaded_in_dbs"].append(db_name)
+    extensions = [
+        {**ext, "loaded_in_dbs": list(ext_to_dbs.get(ext["name"], ()))}
+        for ext in discover_extensions()
+    ]
     
     return {"extensions": extensions}
 
 @app.post("/extensions/load", tags=["Extensions"])
-async def load_extension_endpoint(
-    req: LoadExtensionRequest,
-    api_key: str = Depends(verify_api_key)
-):
+async def load_extension_endpoint(req: LoadExtensionRequest):
     """Loads an extension into a specified database"""
     # Check if the database exists
     db_path = os.path.join(settings.DB_DIR, f"{req.db_name}.db")
@@ -396,21 +623,20 @@ async def load_extension_endpoint(
         )
     
     try:
-        # Try to load the extension
-        load_extension(req.db_name, req.extension_name, req.entry_point)
+        # Try to load the extension; borrowing a pooled connection can block, so not on the event loop
+        await run_in_executor(load_extension, req.db_name, req.extension_name, req.entry_point)
         return {
             "message": f"Extension '{req.extension_name}' successfully loaded into database '{req.db_name}'",
             "db_name": req.db_name,
             "extension": req.extension_name
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/extensions/{extension_name}", tags=["Extensions"])
-async def get_extension_info(
-    extension_name: str,
-    api_key: str = Depends(verify_api_key)
-):
+async def get_extension_info(extension_name: str):
     """Gets information about a specific extension"""
     extension_path = os.path.join(settings.EXTENSIONS_DIR, extension_name)
     if not os.path.exists(extension_path):
@@ -419,37 +645,26 @@ async def get_extension_info(
             detail=f"Extension '{extension_name}' not found"
         )
     
-    # List databases that have this extension loaded
-    loaded_in_dbs = []
-    for db_name, extensions in db_extensions.items():
-        if extension_name in extensions:
-            loaded_in_dbs.append(db_name)
-    
     return {
         "name": extension_name,
         "path": extension_path,
-        "loaded_in_dbs": loaded_in_dbs
+        "loaded_in_dbs": list(ext_to_dbs.get(extension_name, ()))
     }
 
 @app.get("/db/{db_name}/extensions", tags=["Extensions"])
-async def get_db_extensions(
-    db_name: str,
-    api_key: str = Depends(verify_api_key)
-):
+async def get_db_extensions(db_name: str):
     """Lists all extensions loaded in a specific database"""
-    if db_name not in db_extensions:
+    extensions = db_extensions.get(db_name)
+    if extensions is None:
         raise HTTPException(status_code=404, detail=f"Database '{db_name}' not found or has no extensions")
     
     return {
         "db_name": db_name,
-        "extensions": db_extensions[db_name]
+        "extensions": list(extensions)
     }
 
 @app.post("/extensions/upload", tags=["Extensions"])
-async def upload_extension(
-    request: Request,
-    api_key: str = Depends(verify_api_key)
-):
+async def upload_extension(request: Request):
     """Upload a new SQLite extension (placeholder for future implementation)"""
     # Basic implementation for demonstration
     # In a production system, a proper file upload should be implemented
@@ -461,43 +676,37 @@ async def upload_extension(
 @app.on_event("startup")
 async def startup_event():
     """Runs when the API starts up"""
+    global executor_slots, stream_slots
+    db_names = [path.stem for path in Path(settings.DB_DIR).glob("*.db")]
+
     # Create the default database if it doesn't exist
-    databases = os.listdir(settings.DB_DIR)
-    ## initialize all databases
-    for db_name in databases:
-        db_path = os.path.join(settings.DB_DIR, f"{db_name}")
-        if not os.path.exists(db_path):
-            init_db(db_name)
-            print(f"Database '{db_name}' created")
-        else:
-            print(f"Database '{db_name}' already exists")
-        db_connections[db_name] = sqlean.connect(db_path)
-        db_extensions[db_name] = []
-    
+    if "default" not in db_names:
+        init_db("default")
+        logger.info("Database 'default' created")
+        db_names.append("default")
+
+    # Open every database once, with its pragmas and extensions, before serving requests
+    for db_name in db_names:
+        _open_db(db_name)
+        logger.info("Database '%s' opened", db_name)
+
+    # Bound the work waiting on the thread pool
+    executor_slots = asyncio.Semaphore(settings.MAX_PENDING_QUERIES)
+    stream_slots = asyncio.Semaphore(settings.MAX_STREAMS)
+
     # Start the periodic cache cleanup task
     asyncio.create_task(periodic_cache_cleanup())
-    
-    # Try to automatically load available extensions into the default database
-    try:
-        extensions = discover_extensions()
-        for ext in extensions:
-            try:
-                load_extension("default", os.path.basename(ext["path"]))
-                print(f"Extension {ext['name']} automatically loaded into 'default' database")
-            except Exception as e:
-                print(f"Could not load extension {ext['name']}: {str(e)}")
-    except Exception as e:
-        print(f"Error discovering extensions: {str(e)}")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Runs when the API is shutting down"""
     # Close all database connections
-    for conn in db_connections.values():
-        conn.close()
+    for pool in db_pools.values():
+        pool.close()
     # Shut down the thread pool
     executor.shutdown()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=settings.LOG_LEVEL.upper())
     print(settings)
-    uvicorn.run(app, host=settings.APP_HOST, port=settings.APP_PORT)
\ No newline at end of file
+    uvicorn.run(app, host=settings.APP_HOST, port=settings.APP_PORT, log_level=settings.LOG_LEVEL.lower())
\ No newline at end of file
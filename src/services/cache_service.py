@@ -1,27 +1,76 @@
+import re
 import time
 import json
 import hashlib
+import threading
+from functools import lru_cache
+from heapq import heapify, heappop, heappush
+import orjson
 from typing import Dict, Any, List, Tuple, Optional
 from config import settings
 
+# Bound once, the cache methods read the clock on every call
+_clock = time.time
+
+
+def _measure_result(result: Any) -> Tuple[int, str]:
+    """Return the serialized size and a content digest of a result, computed once when it is cached."""
+    data = orjson.dumps(result, default=str)
+    return len(data), hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+class CacheEntry:
+    """A cached query result with its expiry and usage data."""
+    # Slots instead of a per-instance __dict__, there is one of these per cached item
+    __slots__ = ("result", "expiry", "hits", "size", "digest", "referenced", "slot")
+    
+    def __init__(self, result: Any, expiry: float, hits: int, size: int, digest: str, slot: int):
+        self.result = result
+        self.expiry = expiry
+        self.hits = hits
+        self.size = size
+        self.digest = digest  # Changes whenever the cached data does, used for ETags
+        self.referenced = False  # CLOCK reference bit, set on every hit
+        self.slot = slot  # Position in QueryCache._slots
+
+
 class QueryCache:
     """
-    LRU cache implementation for query results with expiration.
+    CLOCK cache implementation for query results with expiration.
     
     Features:
     - Time-based expiration
-    - LRU (Least Recently Used) eviction policy
+    - CLOCK (second chance) eviction policy, an approximation of LRU
     - Cache statistics
     - Custom TTL per item
+    
+    A hit only sets the item's reference bit; nothing is reordered. When the
+    cache is full, the clock hand walks the slots, clearing reference bits
+    until it reaches an item that has not been used since its last pass.
+    
+    cachetools.TTLCache is not used because it applies one TTL to the whole
+    cache, while queries here can set their own cache_ttl.
     """
     
-    def __init__(self):
-        """Initialize the cache."""
-        self.cache = {}  # {hash: {result, timestamp, hits, last_hit_time}}
-        self.expiration_times = {}  # {hash: expiration_time}
-        self.lru_keys = []  # List to implement LRU
-        self.max_cache_size = settings.MAX_CACHE_SIZE
+    def __init__(self, max_cache_size: Optional[int] = None):
+        """
+        Initialize the cache.
+        
+        Args:
+            max_cache_size: Maximum number of items, uses MAX_CACHE_SIZE if None
+        """
+        self.cache = {}  # {hash: CacheEntry}
+        self.max_cache_size = max(1, max_cache_size if max_cache_size is not None else settings.MAX_CACHE_SIZE)
         self.default_ttl = settings.CACHE_EXPIRY
+        self._total_size = 0  # Sum of entry sizes, kept in step with self.cache
+        self._expiry_heap = []  # (expiry, hash) min-heap, may hold stale pairs for replaced items
+        self._slots = []  # Keys in clock order, None marks a slot freed by removal
+        self._free_slots = []  # Indexes of the None slots
+        self._hand = 0  # Next slot the clock hand examines
+    
+    def __len__(self) -> int:
+        """Return the number of cached items."""
+        return len(self.cache)
     
     def get(self, cache_key: str) -> Tuple[Optional[Any], bool]:
         """
@@ -35,29 +84,38 @@ class QueryCache:
             - result is the cached data or None if not found
             - hit is a boolean indicating if the cache lookup was successful
         """
-        if cache_key in self.cache:
-            cache_item = self.cache[cache_key]
-            expiry = self.expiration_times.get(cache_key, time.time() + self.default_ttl)
+        item = self.lookup(cache_key)
+        if item is None:
+            return None, False
+        return item[0], True
+    
+    def lookup(self, cache_key: str) -> Optional[Tuple[Any, str, float]]:
+        """
+        Retrieve an item with its digest and expiry if it exists and is valid.
+        
+        Args:
+            cache_key: The key to look up in the cache
             
-            # Check if the cache has expired
-            if time.time() < expiry:
-                # Update usage statistics
-                cache_item["hits"] += 1
-                cache_item["last_hit_time"] = time.time()
-                
-                # Update position in LRU list
-                if cache_key in self.lru_keys:
-                    self.lru_keys.remove(cache_key)
-                self.lru_keys.append(cache_key)
-                
-                return cache_item["result"], True
-            else:
-                # Remove expired item
-                self._remove_item(cache_key)
+        Returns:
+            Tuple of (result, digest, expiry), or None if not found or expired
+        """
+        entry = self.cache.get(cache_key)
+        if entry is None:
+            return None
         
-        return None, False
+        now = _clock()
+        if now >= entry.expiry:
+            # Remove expired item
+            self._remove_item(cache_key)
+            return None
+        
+        # Update usage statistics and give the item a second chance at the next eviction sweep
+        entry.hits += 1
+        entry.referenced = True
+        return entry.result, entry.digest, entry.expiry
     
-    def set(self, cache_key: str, result: Any, ttl: Optional[int] = None) -> None:
+    def set(self, cache_key: str, result: Any, ttl: Optional[int] = None,
+            size: Optional[int] = None, digest: Optional[str] = None) -> str:
         """
         Add or update an item in the cache.
         
@@ -65,27 +123,82 @@ class QueryCache:
             cache_key: The key to store the result under
             result: The data to cache
             ttl: Time-to-live in seconds, uses default if None
+            size: Serialized size of the result, measured here if None
+            digest: Content digest of the result, computed here if None
+            
+        Returns:
+            The content digest of the stored result
         """
-        if len(self.cache) >= self.max_cache_size:
-            # Remove the least recently used item
-            self._remove_lru_item()
+        cache = self.cache
+        now = _clock()
+        
+        # Expire a few due items per insert so no periodic full sweep is needed
+        self._evict_expired(now, limit=16)
         
         # Calculate expiration time
-        expiry_time = time.time() + (ttl if ttl is not None else self.default_ttl)
-        
-        # Store result and metadata
-        self.cache[cache_key] = {
-            "result": result,
-            "timestamp": time.time(),
-            "hits": 1,
-            "last_hit_time": time.time()
-        }
-        self.expiration_times[cache_key] = expiry_time
+        expiry_time = now + (ttl if ttl is not None else self.default_ttl)
+        if size is None or digest is None:
+            size, digest = _measure_result(result)
+        
+        entry = cache.get(cache_key)
+        if entry is not None:
+            # Update in place, the item keeps its slot and counts as used
+            self._total_size += size - entry.size
+            entry.result = result
+            entry.expiry = expiry_time
+            entry.hits = 1
+            entry.size = size
+            entry.digest = digest
+            entry.referenced = True
+        else:
+            slot = self._claim_slot()
+            self._slots[slot] = cache_key
+            cache[cache_key] = CacheEntry(
+                result=result,
+                expiry=expiry_time,
+                hits=1,
+                size=size,
+                digest=digest,
+                slot=slot
+            )
+            self._total_size += size
         
-        # Add to LRU list
-        if cache_key in self.lru_keys:
-            self.lru_keys.remove(cache_key)
-        self.lru_keys.append(cache_key)
+        heap = self._expiry_heap
+        heappush(heap, (expiry_time, cache_key))
+        if len(heap) > 2 * self.max_cache_size:
+            # Too many stale pairs from evicted or replaced items, rebuild from live entries
+            heap[:] = [(v.expiry, k) for k, v in cache.items()]
+            heapify(heap)
+        
+        return digest
+    
+    def _claim_slot(self) -> int:
+        """Return a free slot index, evicting an item if the cache is full."""
+        if self._free_slots:
+            return self._free_slots.pop()
+        if len(self._slots) < self.max_cache_size:
+            self._slots.append(None)
+            return len(self._slots) - 1
+        self._evict_clock_item()
+        return self._free_slots.pop()
+    
+    def _evict_clock_item(self) -> None:
+        """Advance the clock hand to the first unreferenced item and remove it."""
+        # Only called when every slot is taken; ends within two turns of the clock
+        slots = self._slots
+        cache = self.cache
+        slot_count = len(slots)
+        hand = self._hand
+        while True:
+            cache_key = slots[hand]
+            hand = (hand + 1) % slot_count
+            entry = cache[cache_key]
+            if entry.referenced:
+                entry.referenced = False
+            else:
+                self._hand = hand
+                self._remove_item(cache_key)
+                return
     
     def _remove_item(self, cache_key: str) -> None:
         """
@@ -94,18 +207,11 @@ class QueryCache:
         Args:
             cache_key: The key to remove
         """
-        if cache_key in self.cache:
-            del self.cache[cache_key]
-        if cache_key in self.expiration_times:
-            del self.expiration_times[cache_key]
-        if cache_key in self.lru_keys:
-            self.lru_keys.remove(cache_key)
-    
-    def _remove_lru_item(self) -> None:
-        """Remove the least recently used item from the cache."""
-        if self.lru_keys:
-            lru_key = self.lru_keys.pop(0)
-            self._remove_item(lru_key)
+        entry = self.cache.pop(cache_key, None)
+        if entry is not None:
+            self._total_size -= entry.size
+            self._slots[entry.slot] = None
+            self._free_slots.append(entry.slot)
     
     def get_stats(self) -> Dict[str, Any]:
         """
@@ -116,17 +222,20 @@ class QueryCache:
         """
         stats = {
             "total_items": len(self.cache),
-            "hits_by_query": {k: v["hits"] for k, v in self.cache.items()},
-            "total_size": sum(len(json.dumps(v["result"])) for v in self.cache.values()),
-            "expiration_times": {k: time.ctime(v) for k, v in self.expiration_times.items()}
+            "hits_by_query": {k: v.hits for k, v in self.cache.items()},
+            "total_size": self._total_size,
+            "expiration_times": {k: time.ctime(v.expiry) for k, v in self.cache.items()}
         }
         return stats
     
     def clear(self) -> None:
         """Clear all items from the cache."""
         self.cache.clear()
-        self.expiration_times.clear()
-        self.lru_keys.clear()
+        self._total_size = 0
+        self._expiry_heap.clear()
+        self._slots.clear()
+        self._free_slots.clear()
+        self._hand = 0
     
     def cleanup_expired(self) -> int:
         """
@@ -135,16 +244,164 @@ class QueryCache:
         Returns:
             Number of items removed
         """
-        current_time = time.time()
-        expired_keys = [
-            k for k, v in self.expiration_times.items() 
-            if current_time > v
-        ]
+        return self._evict_expired(_clock())
+    
+    def _evict_expired(self, now: float, limit: Optional[int] = None) -> int:
+        """
+        Remove expired items in expiry order.
+        
+        Args:
+            now: Current timestamp
+            limit: Maximum number of heap entries to pop, unbounded if None
+            
+        Returns:
+            Number of items removed
+        """
+        heap = self._expiry_heap
+        cache_get = self.cache.get
+        remove_item = self._remove_item
+        removed = 0
+        popped = 0
+        
+        # Pop in expiry order, stopping at the first item still valid
+        while heap and heap[0][0] <= now and (limit is None or popped < limit):
+            expiry, key = heappop(heap)
+            popped += 1
+            entry = cache_get(key)
+            # Skip stale pairs whose item was removed or stored again since
+            if entry is not None and entry.expiry == expiry:
+                remove_item(key)
+                removed += 1
+        
+        return removed
+
+
+class ShardedQueryCache:
+    """
+    Query cache split into independently locked QueryCache shards.
+    
+    Keys are routed to a shard by their leading hex digits, so concurrent
+    lookups of different queries rarely wait on the same lock. Each shard
+    holds an equal part of MAX_CACHE_SIZE.
+    """
+    
+    def __init__(self, shard_count: int = 16):
+        """
+        Initialize the shards.
         
-        for key in expired_keys:
-            self._remove_item(key)
+        Args:
+            shard_count: Number of shards, at most 256
+        """
+        shard_size = max(1, settings.MAX_CACHE_SIZE // shard_count)
+        self.shards = [QueryCache(max_cache_size=shard_size) for _ in range(shard_count)]
+        self.locks = [threading.Lock() for _ in range(shard_count)]
+    
+    def __len__(self) -> int:
+        """Return the number of cached items across all shards."""
+        return sum(len(shard) for shard in self.shards)
+    
+    def _shard_index(self, cache_key: str) -> int:
+        """Pick a shard from the key's first byte; keys are already uniform hex digests."""
+        return int(cache_key[:2], 16) % len(self.shards)
+    
+    def get(self, cache_key: str) -> Tuple[Optional[Any], bool]:
+        """Retrieve an item from its shard, see QueryCache.get."""
+        index = self._shard_index(cache_key)
+        with self.locks[index]:
+            return self.shards[index].get(cache_key)
+    
+    def lookup(self, cache_key: str) -> Optional[Tuple[Any, str, float]]:
+        """Retrieve an item with its digest and expiry from its shard, see QueryCache.lookup."""
+        index = self._shard_index(cache_key)
+        with self.locks[index]:
+            return self.shards[index].lookup(cache_key)
+    
+    def set(self, cache_key: str, result: Any, ttl: Optional[int] = None) -> str:
+        """Add or update an item in its shard, see QueryCache.set."""
+        # Serializing a large result can take a while, keep it out of the lock
+        # that cache hits on the event loop wait on
+        size, digest = _measure_result(result)
+        index = self._shard_index(cache_key)
+        with self.locks[index]:
+            return self.shards[index].set(cache_key, result, ttl, size, digest)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Return statistics aggregated over all shards.
+        
+        Returns:
+            Dictionary containing cache stats
+        """
+        stats = {
+            "total_items": 0,
+            "hits_by_query": {},
+            "total_size": 0,
+            "expiration_times": {}
+        }
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                shard_stats = shard.get_stats()
+            stats["total_items"] += shard_stats["total_items"]
+            stats["hits_by_query"].update(shard_stats["hits_by_query"])
+            stats["total_size"] += shard_stats["total_size"]
+            stats["expiration_times"].update(shard_stats["expiration_times"])
+        return stats
+    
+    def clear(self) -> None:
+        """Clear all items from every shard."""
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                shard.clear()
+    
+    def cleanup_expired(self) -> int:
+        """
+        Remove all expired items from every shard.
         
-        return len(expired_keys)
+        Returns:
+            Number of items removed
+        """
+        removed = 0
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                removed += shard.cleanup_expired()
+        return removed
+
+
+# Never updated itself, only copied, so it is safe to share between threads
+_base_hasher = hashlib.blake2b(digest_size=16)
+
+
+@lru_cache(maxsize=64)
+def _encode_db_name(db_name: str) -> bytes:
+    """Encode a database name; there are only a handful of them."""
+    return db_name.encode()
+
+
+_WS_RE = re.compile(rb"\s+")
+
+# Larger queries and params are hashed on every call rather than kept alive as memo keys
+_MEMO_MAX_BYTES = 4096
+
+
+def _normalize_query(query: str) -> bytes:
+    """Lowercase a query and collapse its whitespace in one pass."""
+    return _WS_RE.sub(b" ", query.lower().encode()).strip()
+
+
+def _cache_key(query: str, params_json: Optional[bytes], db_name: str) -> str:
+    """Hash a query with its serialized params."""
+    h = _base_hasher.copy()
+    h.update(_encode_db_name(db_name))
+    h.update(b"\x00")
+    h.update(_normalize_query(query))
+    if params_json is not None:
+        h.update(b"\x00")
+        h.update(params_json)
+    return h.hexdigest()
+
+
+# Memoized since the same small calls repeat
+_memoized_cache_key = lru_cache(maxsize=2048)(_cache_key)
 
 
 # Generate a cache key based on the query and parameters
@@ -158,9 +415,17 @@ def generate_cache_key(query: str, params: Optional[Dict[str, Any]], db_name: st
         db_name: Database name
         
     Returns:
-        MD5 hash to use as cache key
+        BLAKE2b (128-bit) hex digest to use as cache key
     """
-    query_normalized = " ".join(query.split()).lower()
-    params_str = json.dumps(params, sort_keys=True) if params else ""
-    key_data = f"{db_name}:{query_normalized}:{params_str}"
-    return hashlib.md5(key_data.encode()).hexdigest()
\ No newline at end of file
+    # Params may hold unhashable values, so they are keyed by their sorted JSON form
+    params_json = None
+    if params:
+        try:
+            params_json = orjson.dumps(params, option=orjson.OPT_SORT_KEYS)
+        except orjson.JSONEncodeError:
+            # orjson rejects some valid JSON, e.g. integers beyond 64 bits
+            params_json = json.dumps(params, sort_keys=True, default=str).encode()
+    
+    if len(query) + (len(params_json) if params_json is not None else 0) <= _MEMO_MAX_BYTES:
+        return _memoized_cache_key(query, params_json, db_name)
+    return _cache_key(query, params_json, db_name)
@@ -0,0 +1,79 @@
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the pool's timeout"""
+
+
+class ConnectionPool:
+    """
+    Pool of SQLite connections for a single database.
+
+    Features:
+    - Connections are opened lazily, up to a maximum size
+    - Each connection is used by one thread at a time
+    - Open transactions are rolled back when a connection is returned
+    - Waiting for a free connection gives up after a timeout
+    """
+
+    def __init__(self, factory: Callable[[], Any], max_size: int, timeout: Optional[float] = None):
+        """
+        Initialize the pool.
+
+        Args:
+            factory: Callable that opens a new connection
+            max_size: Maximum number of open connections
+            timeout: Seconds to wait for a free connection, waits forever if None
+        """
+        self.factory = factory
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle = queue.Queue(maxsize=max_size)
+        self.connections: List[Any] = []  # Every connection opened by the pool
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """
+        Borrow a connection, returning it to the pool afterwards.
+
+        Yields:
+            An open connection
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self.idle.put(conn)
+
+    def _acquire(self) -> Any:
+        """Take an idle connection, opening a new one while below the size limit."""
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.lock:
+            can_open = len(self.connections) < self.max_size
+            if can_open:
+                conn = self.factory()
+                self.connections.append(conn)
+        if can_open:
+            return conn
+
+        # Pool exhausted, wait for a connection to be returned
+        try:
+            return self.idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeout(f"No connection free after {self.timeout} seconds")
+
+    def close(self) -> None:
+        """Close every connection opened by the pool."""
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections.clear()
@@ -0,0 +1,95 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+from config import settings
+
+class QueryResultsStore:
+    """
+    Bounded store for the results of tracked queries.
+
+    Features:
+    - Time-based expiration
+    - Fixed maximum size, oldest entries are dropped first
+    - Thread-safe access
+    """
+
+    def __init__(self):
+        """Initialize the store."""
+        self.results = OrderedDict()  # {query_id: (expire_ts, value)}
+        self.max_size = settings.MAX_CACHE_SIZE
+        self.default_ttl = settings.CACHE_EXPIRY
+        self.lock = threading.Lock()
+
+    def get(self, query_id: str) -> Optional[Any]:
+        """
+        Retrieve the result stored for a query if it has not expired.
+
+        Args:
+            query_id: The ID the result was stored under
+
+        Returns:
+            The stored result, or None if missing or expired
+        """
+        with self.lock:
+            item = self.results.get(query_id)
+            if item is None:
+                return None
+
+            expire_ts, value = item
+            if time.time() >= expire_ts:
+                del self.results[query_id]
+                return None
+            return value
+
+    def set(self, query_id: str, value: Any, ttl: Optional[int] = None) -> None:
+        """
+        Store the result of a query.
+
+        Args:
+            query_id: The ID to store the result under
+            value: The result data
+            ttl: Time-to-live in seconds, uses default if None
+        """
+        now = time.time()
+        expire_ts = now + (ttl if ttl is not None else self.default_ttl)
+
+        with self.lock:
+            # Drop expired results from the old end; the periodic cleanup
+            # catches any stragglers stored with a longer TTL
+            while self.results:
+                oldest_ts, _ = next(iter(self.results.values()))
+                if now < oldest_ts:
+                    break
+                self.results.popitem(last=False)
+
+            self.results[query_id] = (expire_ts, value)
+            self.results.move_to_end(query_id)
+
+            while len(self.results) > self.max_size:
+                self.results.popitem(last=False)
+
+    def cleanup_expired(self) -> int:
+        """
+        Remove all expired results from the store.
+
+        Returns:
+            Number of results removed
+        """
+        with self.lock:
+            return self._evict_expired(time.time())
+
+    def _evict_expired(self, now: float) -> int:
+        """
+        Remove expired results. Must be called with the lock held.
+
+        Args:
+            now: Current timestamp
+
+        Returns:
+            Number of results removed
+        """
+        expired_ids = [k for k, (expire_ts, _) in self.results.items() if now >= expire_ts]
+        for query_id in expired_ids:
+            del self.results[query_id]
+        return len(expired_ids)